@@ -6,7 +6,8 @@ A pragmatic Python CLI for working with large JSON logs.
 Features
 - Normalize mixed inputs (JSON array / NDJSON / single JSON object) into one NDJSON
 - Generate a *flattened* extraction SELECT (policy A):
-    * scalars -> extracted into columns (as strings to avoid type drift)
+    * scalars -> extracted into typed columns (BIGINT / DOUBLE / BOOLEAN when the sampled
+      values agree, strings otherwise; --all-varchar for strings only)
     * arrays/objects -> kept as JSON columns
 - Build a Parquet dataset with DuckDB
 - Run ad-hoc SQL queries and export CSV
@@ -20,19 +21,65 @@ Notes
 from __future__ import annotations
 
 import argparse
+import fnmatch
 import json
+import multiprocessing
+import os
 import re
 import sys
-from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterator, List, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import duckdb
+import orjson
+
+try:  # optional: C-backed (yajl2_c) streaming parser for JSON array files
+    import ijson
+except ImportError:
+    ijson = None
+
+# Single STRUCT column of the `raw` table holding each parsed record.
+RAW_COLUMN = "rec"
+# Column of the `raw` table holding each record's original JSON text.
+RAW_JSON_COLUMN = "raw_json"
+# Largest single JSON record read_json_auto accepts (bytes).
+MAX_OBJECT_SIZE = 256 * 1024 * 1024
+# Rows per Parquet row group (DuckDB's default vector-aligned size).
+PARQUET_ROW_GROUP_SIZE = 122880
+# ZSTD level for Parquet: good ratio on repetitive log strings at low CPU cost.
+DEFAULT_ZSTD_LEVEL = 3
+# Rows fetched per batch when printing query results.
+QUERY_BATCH_ROWS = 10_000
+# Output buffer for NDJSON writes (bytes).
+WRITE_BUFFER_SIZE = 1 << 20
+# Memoized keys/paths; the same keys repeat across every sampled record.
+_PATH_CACHE_SIZE = 100_000
+# Below this NDJSON size, schema sampling stays in-process (pool startup is not worth it).
+PARALLEL_SAMPLE_MIN_BYTES = 64 * 1024 * 1024
+# Fewest --sample records per worker process; smaller samples are parsed faster in-process.
+PARALLEL_SAMPLE_MIN_RECORDS = 100_000
+# Characters not allowed in generated column names.
+_COLNAME_RE = re.compile(r"[^A-Za-z0-9_]+")
+# Struct field reference in a flat SELECT (see _jsonpath_to_struct_ref).
+_STRUCT_REF = rf'{RAW_COLUMN}(?:\."(?:[^"]|"")*")*'
+# Any struct field read of a flat SELECT: typed scalar (groups 1, 2: reference, type),
+# string scalar (group 3) or JSON value (group 4).
+_STRUCT_READ_RE = re.compile(
+    rf"TRY_CAST\(({_STRUCT_REF}) AS ([A-Z]+)\)|to_json\(({_STRUCT_REF})\) ->> '\$'|to_json\(({_STRUCT_REF})\)"
+)
+# Whitespace and element separators between values of a streamed JSON array.
+_ARRAY_SEP_RE = re.compile(r"[ \t\r\n,]*")
+# Lines skipped without parsing when reading NDJSON in binary mode.
+_BLANK_LINES = (b"", b"\n", b"\r\n")
+# A run of 20+ digits may be an integer beyond uint64, which orjson reads as a float.
+_LONG_DIGITS_RE = re.compile(rb"[0-9]{20}")
 
 
 # ---------------------------
 # JSON streaming utilities
 # ---------------------------
+@lru_cache(maxsize=_PATH_CACHE_SIZE)
 def _jsonpath_key_segment(k: str) -> str:
     """
     DuckDB JSONPath: $.key か $."key.with.specials" のどちらか。
@@ -51,88 +98,103 @@ def iter_json_array_stream(fp) -> Iterator[object]:
     Supports files shaped like:
         [ {...}, {...}, ... ]
     potentially pretty-printed with whitespace/newlines.
+
+    Pure-Python fallback used when ijson is not installed (see iter_records_from_file).
     """
-    decoder = json.JSONDecoder()
-    buf = ""
+    raw_decode = json.JSONDecoder().raw_decode
+    skip_sep = _ARRAY_SEP_RE.match
     chunk_size = 1024 * 1024  # 1MB
+    # `buf[pos:]` is the unconsumed input. Values are decoded in place at `pos`; the
+    # consumed prefix is only dropped when more input is appended, so data is copied
+    # O(1) times instead of on every element.
+    buf = ""
+    pos = 0
+    eof = False
+
+    def refill(size: int) -> bool:
+        nonlocal buf, pos, eof
+        chunk = fp.read(size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
 
     # Seek first '['
     while True:
-        chunk = fp.read(chunk_size)
-        if not chunk:
+        if not refill(chunk_size):
             raise ValueError("Unexpected EOF while searching for '['")
-        buf += chunk
-        stripped = buf.lstrip()
-        if not stripped:
-            buf = ""
-            continue
-        idx = stripped.find("[")
+        idx = buf.find("[")
         if idx != -1:
-            buf = stripped[idx + 1 :]
+            pos = idx + 1
             break
+        pos = len(buf)
 
     # Decode elements until ']'
     while True:
         # Skip whitespace and commas
-        i = 0
-        while True:
-            if i >= len(buf):
-                chunk = fp.read(chunk_size)
-                if not chunk:
-                    raise ValueError("Unexpected EOF inside JSON array")
-                buf += chunk
-                continue
-            c = buf[i]
-            if c in " \t\r\n,":
-                i += 1
-                continue
-            break
-        buf = buf[i:]
-
-        # Ensure we have some content
-        while not buf:
-            chunk = fp.read(chunk_size)
-            if not chunk:
-                raise ValueError("Unexpected EOF before ']'")
-            buf += chunk
-
-        # Skip whitespace
-        if buf and buf[0] in " \t\r\n":
-            buf = buf.lstrip()
+        pos = skip_sep(buf, pos).end()
+        if pos >= len(buf):
+            if not refill(chunk_size):
+                raise ValueError("Unexpected EOF inside JSON array")
+            continue
 
         # End?
-        if buf.startswith("]"):
+        if buf[pos] == "]":
             return
 
-        # Decode one JSON value
+        # Decode one JSON value; on a partial value read geometrically more so that
+        # retries over a large element stay linear overall.
+        size = chunk_size
         while True:
             try:
-                obj, end = decoder.raw_decode(buf)
-                yield obj
-                buf = buf[end:]
-                break
+                obj, end = raw_decode(buf, pos)
             except json.JSONDecodeError:
-                chunk = fp.read(chunk_size)
-                if not chunk:
+                if not refill(size):
                     raise
-                buf += chunk
+                size *= 2
+                continue
+            if len(buf) - end <= 2 and not eof and refill(size):
+                # a number cut by the buffer end decodes short ("12" of "123", "3" of "3.5",
+                # "1" of "1e+5"), so decode again once more input follows it
+                continue
+            break
+        yield obj
+        pos = end
+
+
+def parse_ndjson_line(line: bytes) -> object:
+    """Parse one NDJSON line (bytes, newline allowed) with orjson.
+
+    Falls back to json.loads where orjson is not exact or too strict: integers beyond
+    uint64 and NaN / Infinity (as written by json.dumps). Raises ValueError on malformed input.
+    """
+    if _LONG_DIGITS_RE.search(line) is None:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(line)
 
 
 def sniff_json_kind(path: Path) -> str:
     """Return one of: 'array' | 'object' | 'ndjson' | 'unknown'."""
     try:
-        head = path.read_bytes()[:4096]
-    except Exception:
+        with path.open("rb") as fp:
+            head = fp.read(4096)
+    except OSError:
         return "unknown"
-    text = head.decode("utf-8", errors="ignore").lstrip()
-    if not text:
+    head = head.lstrip()
+    if not head:
         return "unknown"
-    if text[0] == "[":
+    first = head[:1]
+    if first == b"[":
         return "array"
-    if text[0] == "{":
+    if first == b"{":
         return "object"
     # best-effort NDJSON guess
-    if "{" in text[:200]:
+    if b"{" in head[:200]:
         return "ndjson"
     return "unknown"
 
@@ -147,115 +209,533 @@ def iter_records_from_file(path: Path) -> Iterator[object]:
     """
     kind = sniff_json_kind(path)
     if kind == "array":
-        with path.open("r", encoding="utf-8") as fp:
-            yield from iter_json_array_stream(fp)
+        if ijson is not None:
+            # Non-integers come back as Decimal (see _ndjson_line); use_float=True would make
+            # yajl2_c fail on integers beyond int64.
+            with path.open("rb") as fp:
+                yield from ijson.items(fp, "item")
+        else:
+            with path.open("r", encoding="utf-8") as fp:
+                yield from iter_json_array_stream(fp)
         return
     if kind == "object":
         with path.open("r", encoding="utf-8") as fp:
             yield json.load(fp)
         return
 
-    # Assume NDJSON-ish: parse line-by-line
-    with path.open("r", encoding="utf-8") as fp:
+    # Assume NDJSON-ish: parse line-by-line from the raw bytes
+    with path.open("rb") as fp:
         for line in fp:
-            s = line.strip()
-            if not s:
+            if line in _BLANK_LINES:
                 continue
             try:
-                yield json.loads(s)
-            except json.JSONDecodeError:
+                yield parse_ndjson_line(line)
+            except ValueError:
                 # skip malformed line
                 continue
 
 
+def _scan_dir(d: str, glob_pat: str) -> List[str]:
+    """Sorted paths of files directly in `d` whose name matches `glob_pat`."""
+    with os.scandir(d) as it:
+        return sorted(e.path for e in it if fnmatch.fnmatchcase(e.name, glob_pat) and e.is_file())
+
+
 def iter_input_files(inputs: List[str], glob_pat: str) -> List[Path]:
     """Expand file/dir inputs into a de-duplicated file list."""
-    out: List[Path] = []
+    # Plain name patterns are matched on a single os.scandir pass; patterns that span
+    # directories (sub/*.json, **/*.json) still need Path.glob.
+    simple = "/" not in glob_pat and "**" not in glob_pat
+    out: List[str] = []
     for inp in inputs:
-        p = Path(inp)
-        if p.is_dir():
-            out.extend(sorted(p.glob(glob_pat)))
-        elif p.is_file():
-            out.append(p)
+        if os.path.isdir(inp):
+            if simple:
+                out.extend(_scan_dir(inp, glob_pat))
+            else:
+                out.extend(str(p) for p in sorted(Path(inp).glob(glob_pat)) if p.is_file())
+        elif os.path.isfile(inp):
+            out.append(inp)
         else:
             print(f"WARN: not found: {inp}", file=sys.stderr)
 
-    seen = set()
-    uniq: List[Path] = []
-    for p in out:
-        if p not in seen:
-            uniq.append(p)
-            seen.add(p)
-    return uniq
+    # Path equality ignores spelling differences such as "./"; dict keeps first-seen order.
+    return list(dict.fromkeys(Path(p) for p in out))
 
 
 # ---------------------------
 # Schema generation (flat select)
 # ---------------------------
 
-def is_scalar(x) -> bool:
-    return x is None or isinstance(x, (str, int, float, bool))
-
-
-def walk_paths(obj, path: str, scalar_paths: "OrderedDict[str,bool]", json_paths: "OrderedDict[str,bool]") -> None:
-    if is_scalar(obj):
-        scalar_paths[path] = True
-        return
-    if isinstance(obj, dict):
-        for k, v in obj.items():
-            if not isinstance(k, str):
-                k = str(k)
-            p = f"{path}{_jsonpath_key_segment(k)}"
-            if is_scalar(v):
-                scalar_paths[p] = True
-            elif isinstance(v, (dict, list)):
-                json_paths[p] = True
-                walk_paths(v, p, scalar_paths, json_paths)
-            else:
-                json_paths[p] = True
+# JSON scalar Python type -> SQL column type (None: null, says nothing about the type).
+_SCALAR_SQL_TYPES = {str: "VARCHAR", int: "BIGINT", float: "DOUBLE", bool: "BOOLEAN", type(None): None}
+
+# Scalar SQL types emitted as native (cast) columns; everything else is a string.
+_CAST_SQL_TYPES = frozenset(("BIGINT", "DOUBLE", "BOOLEAN"))
+# DuckDB inferred type id -> scalar SQL type (see _paths_from_duckdb_type).
+_DUCKDB_SQL_TYPES = {
+    "boolean": "BOOLEAN",
+    "tinyint": "BIGINT",
+    "smallint": "BIGINT",
+    "integer": "BIGINT",
+    "bigint": "BIGINT",
+    "float": "DOUBLE",
+    "double": "DOUBLE",
+}
+_UNSEEN = object()
+# Python ints outside [-_INT64_LIMIT, _INT64_LIMIT) do not fit BIGINT and are typed VARCHAR.
+_INT64_LIMIT = 1 << 63
+
+# Ordered set of JSONPaths: (paths in discovery order, membership set).
+PathSet = Tuple[List[str], Set[str]]
+# Scalar JSONPaths in discovery order -> merged SQL type.
+ScalarPaths = Dict[str, Optional[str]]
+
+
+def merge_sql_types(a: Optional[str], b: Optional[str]) -> Optional[str]:
+    """Combine two observed scalar SQL types; anything mixed except int/float is VARCHAR."""
+    if a is None or a == b:
+        return b
+    if b is None:
+        return a
+    if {a, b} == {"BIGINT", "DOUBLE"}:
+        return "DOUBLE"
+    return "VARCHAR"
+
+
+def walk_paths(root, scalar_paths: ScalarPaths, json_paths: PathSet) -> None:
+    """Record every JSONPath under `root`, depth-first in key order.
+
+    Scalar paths also track the SQL type of the values seen so far (see merge_sql_types);
+    integers beyond int64 are VARCHAR, so such IDs stay exact.
+
+    Iterative (explicit stack of dict iterators) so deeply nested records neither pay
+    per-level call overhead nor hit the recursion limit.
+    """
+    json_list, json_seen = json_paths
+    sql_types = _SCALAR_SQL_TYPES
+    key_segment = _jsonpath_key_segment
+
+    t = type(root)
+    if t in sql_types:
+        st = sql_types[t]
+        if t is int and not -_INT64_LIMIT <= root < _INT64_LIMIT:
+            st = "VARCHAR"
+        if "$" not in scalar_paths:
+            scalar_paths["$"] = st
+        elif scalar_paths["$"] != st:
+            scalar_paths["$"] = merge_sql_types(scalar_paths["$"], st)
         return
-    if isinstance(obj, list):
+    if t is not dict:
         # Policy A: do NOT explode arrays; keep as JSON
-        json_paths[path] = True
+        if "$" not in json_seen:
+            json_seen.add("$")
+            json_list.append("$")
         return
 
+    stack = [("$", iter(root.items()))]
+    while stack:
+        path, items = stack[-1]
+        for k, v in items:
+            if type(k) is not str:
+                k = str(k)
+            p = path + key_segment(k)
+            t = type(v)
+            if t in sql_types:
+                st = sql_types[t]
+                if t is int and not -_INT64_LIMIT <= v < _INT64_LIMIT:
+                    st = "VARCHAR"
+                prev = scalar_paths.get(p, _UNSEEN)
+                if prev is _UNSEEN:
+                    scalar_paths[p] = st
+                elif prev != st:
+                    scalar_paths[p] = merge_sql_types(prev, st)
+                continue
+            # dicts, lists (Policy A) and anything non-JSON are kept as JSON
+            if p not in json_seen:
+                json_seen.add(p)
+                json_list.append(p)
+            if t is dict:
+                stack.append((p, iter(v.items())))
+                break
+        else:
+            stack.pop()
+
 
+@lru_cache(maxsize=_PATH_CACHE_SIZE)
 def colname(path: str) -> str:
     """Convert JSONPath like $.a.b into a safe SQL identifier like a__b."""
     p = path[2:] if path.startswith("$.") else path.replace("$", "root")
     p = p.replace('["', ".").replace('"]', "")
     p = p.replace("[", "_").replace("]", "")
     p = p.replace(".", "__")
-    p = re.sub(r"[^A-Za-z0-9_]+", "_", p)
+    p = _COLNAME_RE.sub("_", p)
     return p or "root"
 
 
-def generate_flat_select_sql(ndjson_path: Path, sample_max: int) -> str:
-    """Generate a SELECT that extracts all discovered scalar paths and JSON paths."""
-    scalar_paths: "OrderedDict[str,bool]" = OrderedDict()
-    json_paths: "OrderedDict[str,bool]" = OrderedDict()
+def _jsonpath_to_struct_ref(path: str) -> str:
+    """Convert JSONPath like $.a."b c" into a struct-field reference on the parsed row.
+
+    Every segment is emitted as a quoted identifier under RAW_COLUMN, so keys that
+    collide with SQL keywords or contain dots/quotes stay unambiguous.
+    """
+    ref = RAW_COLUMN
+    i = 1  # skip leading '$'
+    while i < len(path):
+        # path[i] is always '.'
+        i += 1
+        if path[i] == '"':
+            i += 1
+            key = []
+            while path[i] != '"':
+                if path[i] == "\\":
+                    i += 1
+                key.append(path[i])
+                i += 1
+            i += 1
+            k = "".join(key)
+        else:
+            j = path.find(".", i)
+            if j == -1:
+                j = len(path)
+            k = path[i:j]
+            i = j
+        ref += '."' + k.replace('"', '""') + '"'
+    return ref
+
+
+def default_stable_after(sample_max: int) -> int:
+    """Records without a new path after which sampling is considered converged."""
+    return max(500, sample_max // 20)
+
+
+def _sample_records(
+    records: Iterable[object], sample_max: int, stable_after: int
+) -> Tuple[ScalarPaths, List[str]]:
+    """Discover paths from up to `sample_max` records.
+
+    Returns (scalar path -> SQL type, json_paths), both in discovery order.
+    """
+    scalar_paths: ScalarPaths = {}
+    json_paths: PathSet = ([], set())
+    json_seen = json_paths[1]
 
     cnt = 0
-    with ndjson_path.open("r", encoding="utf-8") as fp:
+    n_paths = 0
+    last_change = 0
+    for obj in records:
+        walk_paths(obj, scalar_paths, json_paths)
+        cnt += 1
+        if cnt >= sample_max:
+            break
+        n = len(scalar_paths) + len(json_seen)
+        if n != n_paths:
+            n_paths = n
+            last_change = cnt
+        elif stable_after and cnt - last_change >= stable_after:
+            break
+
+    return scalar_paths, json_paths[0]
+
+
+def _iter_ndjson_range(ndjson_path: Path, start: int, end: int) -> Iterator[object]:
+    """Yield parsed NDJSON records whose line starts in the byte range [start, end)."""
+    with ndjson_path.open("rb") as fp:
+        pos = 0
+        if start:
+            # Realign to the first line starting at or after `start`.
+            fp.seek(start - 1)
+            pos = start - 1 + len(fp.readline())
         for line in fp:
-            s = line.strip()
-            if not s:
+            if pos >= end:
+                break
+            pos += len(line)
+            if line in _BLANK_LINES:
                 continue
             try:
-                obj = json.loads(s)
-            except json.JSONDecodeError:
+                yield parse_ndjson_line(line)
+            except ValueError:
                 continue
-            walk_paths(obj, "$", scalar_paths, json_paths)
-            cnt += 1
-            if cnt >= sample_max:
-                break
 
-    exprs = ["raw_json"]
-    # To avoid type drift, extract scalars as strings; cast later if needed.
-    for p in scalar_paths.keys():
-        exprs.append(f"json_extract_string(raw_json, '{p}') AS {colname(p)}")
-    for p in json_paths.keys():
-        exprs.append(f"json_extract(raw_json, '{p}') AS {colname(p)}__json")
+
+def _sample_paths(
+    ndjson_path: Path, start: int, end: int, sample_max: int, stable_after: int
+) -> Tuple[ScalarPaths, List[str]]:
+    """Discover paths from NDJSON lines starting in the byte range [start, end).
+
+    Returns (scalar path -> SQL type, json_paths) in discovery order. Runs in worker processes
+    for parallel sampling, so it only takes picklable arguments.
+    """
+    return _sample_records(_iter_ndjson_range(ndjson_path, start, end), sample_max, stable_after)
+
+
+def _merge_paths(parts: List[List[str]]) -> List[str]:
+    """Ordered union of path lists (first occurrence wins)."""
+    return list(dict.fromkeys(p for part in parts for p in part))
+
+
+def _merge_scalar_paths(parts: List[ScalarPaths]) -> ScalarPaths:
+    """Ordered union of scalar path -> SQL type maps, merging the types."""
+    merged: ScalarPaths = {}
+    for part in parts:
+        for p, st in part.items():
+            merged[p] = merge_sql_types(merged[p], st) if p in merged else st
+    return merged
+
+
+def generate_flat_select_sql(
+    ndjson_path: Path, sample_max: int, stable_after: Optional[int] = None, workers: int = 1, typed: bool = True
+) -> str:
+    """Generate a SELECT that extracts all discovered scalar paths and JSON paths.
+
+    Sampling stops early once `stable_after` consecutive records added no new path
+    (default: default_stable_after(sample_max); 0 disables the early stop).
+
+    With workers > 1, a file of at least PARALLEL_SAMPLE_MIN_BYTES and a sample_max giving
+    each worker at least PARALLEL_SAMPLE_MIN_RECORDS (fewer workers are used otherwise), the
+    file is split into `workers` newline-aligned byte ranges sampled in parallel (sample_max
+    is shared between them) and the results are merged in file order.
+    """
+    if stable_after is None:
+        stable_after = default_stable_after(sample_max)
+
+    size = ndjson_path.stat().st_size
+    # The work is bounded by sample_max, not by the file size.
+    workers = min(workers, sample_max // PARALLEL_SAMPLE_MIN_RECORDS)
+    if workers > 1 and size >= PARALLEL_SAMPLE_MIN_BYTES:
+        per_worker = -(-sample_max // workers)
+        bounds = [size * i // workers for i in range(workers + 1)]
+        tasks = [(ndjson_path, bounds[i], bounds[i + 1], per_worker, stable_after) for i in range(workers)]
+        with multiprocessing.Pool(workers) as pool:
+            parts = pool.starmap(_sample_paths, tasks)
+    else:
+        parts = [_sample_paths(ndjson_path, 0, size, sample_max, stable_after)]
+
+    scalar_paths = _merge_scalar_paths([sp for sp, _ in parts])
+    json_paths = _merge_paths([jp for _, jp in parts])
+    return flat_select_sql_from_paths(scalar_paths, json_paths, typed)
+
+
+def generate_flat_select_sql_from_files(
+    con: duckdb.DuckDBPyConnection,
+    files: List[Path],
+    sample_max: int,
+    stable_after: Optional[int] = None,
+    typed: bool = True,
+) -> str:
+    """Generate the flat SELECT by sampling the input files through DuckDB.
+
+    read_json_objects hands back each record's original JSON text (any of array / NDJSON /
+    single object), so paths are discovered exactly as from the normalized NDJSON.
+    """
+    if stable_after is None:
+        stable_after = default_stable_after(sample_max)
+
+    res = con.execute(
+        f"SELECT json FROM read_json_objects(?, format='auto', maximum_object_size={MAX_OBJECT_SIZE}) LIMIT ?",
+        [[f.as_posix() for f in files], sample_max],
+    )
+
+    def records() -> Iterator[object]:
+        while True:
+            rows = res.fetchmany(1000)
+            if not rows:
+                return
+            for (text,) in rows:
+                yield orjson.loads(text)
+
+    scalar_paths, json_paths = _sample_records(records(), sample_max, stable_after)
+    return flat_select_sql_from_paths(scalar_paths, json_paths, typed)
+
+
+def _paths_from_duckdb_type(
+    t: duckdb.DuckDBPyType, path: str, scalar_paths: ScalarPaths, json_paths: List[str]
+) -> None:
+    """Map an inferred DuckDB record type onto the same paths walk_paths would find.
+
+    STRUCT fields are descended into (and kept as a JSON column, like dicts); LIST / MAP
+    are JSON columns; everything else, including JSON (mixed or null-only values),
+    is a scalar, typed via _DUCKDB_SQL_TYPES (VARCHAR otherwise).
+    """
+    if t.id == "struct":
+        if path != "$":
+            json_paths.append(path)
+        for k, child in t.children:
+            _paths_from_duckdb_type(child, path + _jsonpath_key_segment(k), scalar_paths, json_paths)
+    elif t.id in ("list", "array", "map", "union"):
+        json_paths.append(path)
+    else:
+        scalar_paths[path] = _DUCKDB_SQL_TYPES.get(t.id, "VARCHAR")
+
+
+def generate_flat_select_sql_duckdb(
+    con: duckdb.DuckDBPyConnection, sources: List[Path], sample_max: int, json_format: str, typed: bool = True
+) -> str:
+    """Generate the flat SELECT from the record type read_json_auto infers.
+
+    Schema discovery runs in DuckDB's JSON reader over `sample_max` records instead of a
+    Python pass; nothing beyond the inference sample is read.
+    """
+    res = con.execute(
+        f"""
+        SELECT json
+        FROM read_json_auto(?,
+                            format='{json_format}',
+                            records=false,
+                            union_by_name=true,
+                            maximum_object_size={MAX_OBJECT_SIZE},
+                            sample_size=?,
+                            map_inference_threshold=-1)
+        LIMIT 0
+        """,
+        [[f.as_posix() for f in sources], sample_max],
+    )
+    return _flat_select_sql_from_record_type(res.description[0][1], typed)
+
+
+def generate_flat_select_sql_from_raw(con: duckdb.DuckDBPyConnection, typed: bool = True) -> str:
+    """Generate the flat SELECT from the record type of an already loaded `raw` table.
+
+    That type was inferred over every record while loading, so this reads no data.
+    """
+    res = con.execute(f"SELECT {RAW_COLUMN} FROM raw LIMIT 0")
+    return _flat_select_sql_from_record_type(res.description[0][1], typed)
+
+
+def _paths_with_oversized_ints(con: duckdb.DuckDBPyConnection, paths: List[str]) -> Set[str]:
+    """Those of `paths` where some record in `raw` holds an integer beyond int64.
+
+    read_json_auto types such fields DOUBLE, which loses their digits. Only records whose
+    text has a 19-digit run are looked at.
+    """
+    if not paths:
+        return set()
+    checks = []
+    for p in paths:
+        v = f"json_extract_string({RAW_JSON_COLUMN}, {sql_literal(p)})"
+        checks.append(f"bool_or(regexp_matches({v}, '^-?[0-9]+$') AND TRY_CAST({v} AS BIGINT) IS NULL)")
+    row = con.execute(
+        f"SELECT {', '.join(checks)} FROM raw WHERE regexp_matches({RAW_JSON_COLUMN}, '[0-9]{{19}}')"
+    ).fetchone()
+    return {p for p, hit in zip(paths, row) if hit}
+
+
+def widen_casts_to_raw(con: duckdb.DuckDBPyConnection, flat_select_sql: str) -> str:
+    """Widen the typed columns of a flat SELECT to the types of the loaded `raw` table.
+
+    Sampled types (gen-schema, python discovery) can be narrower than what the records past
+    the sample hold, and TRY_CAST rounds e.g. 2.5 to a BIGINT 2. Each cast is widened with
+    merge_sql_types against `raw`'s inferred type (BIGINT -> DOUBLE, or a string column).
+    Scalars of DOUBLE fields that hold integers beyond int64 are extracted as strings from
+    the raw_json text instead, so those keep every digit.
+    """
+    scalar_paths: ScalarPaths = {}
+    _paths_from_duckdb_type(raw_struct_type(con), "$", scalar_paths, [])
+    raw_types = {_jsonpath_to_struct_ref(p): st for p, st in scalar_paths.items()}
+    refs = {m.group(1) or m.group(3) for m in _STRUCT_READ_RE.finditer(flat_select_sql)}
+    doubles = [_struct_ref_to_jsonpath(r) for r in refs if r and raw_types.get(r) == "DOUBLE"]
+    text_paths = _paths_with_oversized_ints(con, doubles)
+
+    def widen(m: re.Match) -> str:
+        ref = m.group(1) or m.group(3)
+        if ref is None:
+            return m.group(0)
+        path = _struct_ref_to_jsonpath(ref)
+        if path in text_paths:
+            return f"json_extract_string({RAW_JSON_COLUMN}, {sql_literal(path)})"
+        st = m.group(2)
+        if st is None:
+            return m.group(0)
+        wide = merge_sql_types(st, raw_types.get(ref))
+        if wide == st:
+            return m.group(0)
+        if wide in _CAST_SQL_TYPES:
+            return f"TRY_CAST({ref} AS {wide})"
+        return f"to_json({ref}) ->> '$'"
+
+    return _STRUCT_READ_RE.sub(widen, flat_select_sql)
+
+
+def _struct_ref_to_jsonpath(ref: str) -> str:
+    """Inverse of _jsonpath_to_struct_ref."""
+    keys = re.findall(r'"((?:[^"]|"")*)"', ref)
+    return "$" + "".join(_jsonpath_key_segment(k.replace('""', '"')) for k in keys)
+
+
+def raw_struct_type(con: duckdb.DuckDBPyConnection) -> Optional[duckdb.DuckDBPyType]:
+    """Type of the RAW_COLUMN struct of the loaded `raw` table (None: raw_json text only)."""
+    res = con.execute("SELECT * FROM raw LIMIT 0")
+    return next((t for name, t, *_ in res.description if name == RAW_COLUMN), None)
+
+
+def adapt_select_to_raw(con: duckdb.DuckDBPyConnection, flat_select_sql: str) -> str:
+    """Fit a flat SELECT to the loaded `raw` table before the Parquet write.
+
+    With a RAW_COLUMN struct, typed columns are widened (widen_casts_to_raw). Without one
+    (see _create_raw), every struct field read becomes an extraction from the raw_json
+    text instead: scalars as strings, like --all-varchar, and JSON values as JSON.
+    """
+    if raw_struct_type(con) is not None:
+        return widen_casts_to_raw(con, flat_select_sql)
+
+    def from_text(m: re.Match) -> str:
+        if m.group(4) is not None:
+            return f"json_extract({RAW_JSON_COLUMN}, {sql_literal(_struct_ref_to_jsonpath(m.group(4)))})"
+        path = _struct_ref_to_jsonpath(m.group(1) or m.group(3))
+        return f"json_extract_string({RAW_JSON_COLUMN}, {sql_literal(path)})"
+
+    return _STRUCT_READ_RE.sub(from_text, flat_select_sql)
+
+
+def _flat_select_sql_from_record_type(t: duckdb.DuckDBPyType, typed: bool) -> str:
+    scalar_paths: ScalarPaths = {}
+    json_paths: List[str] = []
+    _paths_from_duckdb_type(t, "$", scalar_paths, json_paths)
+    return flat_select_sql_from_paths(scalar_paths, json_paths, typed)
+
+
+def generate_schema_for_ndjson(args: argparse.Namespace, ndjson_path: Path) -> str:
+    """Run the schema discovery selected by --schema-discovery over the NDJSON.
+
+    duckdb discovery falls back to python discovery when DuckDB cannot infer one record
+    type (e.g. keys differing only by case, which a STRUCT cannot hold).
+    """
+    if args.schema_discovery == "duckdb":
+        con = duckdb_connect(Path(":memory:"), args.memory_limit, args.threads)
+        try:
+            return generate_flat_select_sql_duckdb(
+                con, [ndjson_path], args.sample, "newline_delimited", not args.all_varchar
+            )
+        except duckdb.Error as e:
+            print(f"WARN: duckdb schema discovery failed, using python discovery: {str(e).splitlines()[0]}", file=sys.stderr)
+        finally:
+            con.close()
+    return generate_flat_select_sql(
+        ndjson_path, args.sample, args.stable_after, args.sample_workers, not args.all_varchar
+    )
+
+
+def flat_select_sql_from_paths(
+    scalar_paths: ScalarPaths, json_paths: List[str], typed: bool = True
+) -> str:
+    """Build the flat SELECT over `raw` for the given scalar paths (-> SQL type) and JSON paths.
+
+    With typed=False, or for VARCHAR / null-only paths, scalars are extracted as strings.
+    Typed scalars use TRY_CAST to the given type, which rounds values of a wider type;
+    adapt_select_to_raw fixes those casts up against `raw` before the Parquet write.
+    JSON columns are extracted from the raw_json text, so they hold the original values
+    rather than the struct's union type (which adds null keys and turns 1 into 1.0).
+    """
+    exprs = [RAW_JSON_COLUMN]
+    for p, st in scalar_paths.items():
+        ref = _jsonpath_to_struct_ref(p)
+        if typed and st in _CAST_SQL_TYPES:
+            exprs.append(f"TRY_CAST({ref} AS {st}) AS {colname(p)}")
+        else:
+            # Fields with mixed scalar types are inferred as JSON by read_json_auto, so go
+            # through to_json + ->> to get the unquoted string for every column type alike.
+            exprs.append(f"to_json({ref}) ->> '$' AS {colname(p)}")
+    for p in json_paths:
+        exprs.append(f"json_extract({RAW_JSON_COLUMN}, {sql_literal(p)}) AS {colname(p)}__json")
 
     return "SELECT\n  " + ",\n  ".join(exprs) + "\nFROM raw"
 
@@ -264,24 +744,132 @@ def generate_flat_select_sql(ndjson_path: Path, sample_max: int) -> str:
 # DuckDB pipeline
 # ---------------------------
 
-def duckdb_connect(db_path: Path, memory_limit: str) -> duckdb.DuckDBPyConnection:
+def sql_literal(s: str) -> str:
+    """Quote `s` as a SQL string literal, for statements that cannot take parameters (views)."""
+    return "'" + s.replace("'", "''") + "'"
+
+
+def duckdb_connect(
+    db_path: Path, memory_limit: str, threads: Optional[int] = None, temp_dir: Optional[str] = None
+) -> duckdb.DuckDBPyConnection:
     con = duckdb.connect(str(db_path))
-    con.execute(f"PRAGMA memory_limit='{memory_limit}'")
+    con.execute("SET memory_limit = ?", [memory_limit])
+    if threads:
+        con.execute("SET threads = ?", [threads])
+    # Results here are either written to Parquet or ad-hoc (ORDER BY when it matters),
+    # so let the planner skip order-preserving operators.
+    con.execute("SET preserve_insertion_order = false")
+    # Cache Parquet metadata across the queries of one connection.
+    con.execute("SET enable_object_cache = true")
+    con.execute("SET enable_progress_bar = false")
+    if temp_dir:
+        # Spill files (large sorts / Parquet writes) go to this directory.
+        con.execute("SET temp_directory = ?", [Path(temp_dir).as_posix()])
     return con
 
 
-def create_raw_from_ndjson(con: duckdb.DuckDBPyConnection, ndjson_path: Path) -> None:
-    # Read NDJSON as a single VARCHAR column; parse with json_extract* later.
+def _json_structure(t: duckdb.DuckDBPyType) -> object:
+    """json_transform structure for an inferred record type.
+
+    read_json_auto also detects DATE / TIME / TIMESTAMP / UUID from string values (and
+    normalizes them, e.g. shifts offset timestamps to UTC); those are read as VARCHAR so
+    every string keeps its original text.
+    """
+    if t.id == "struct":
+        return {k: _json_structure(child) for k, child in t.children}
+    if t.id in ("list", "array"):
+        return [_json_structure(t.child)]
+    if t.id in _DUCKDB_SQL_TYPES or str(t) == "JSON":
+        return str(t)
+    return "VARCHAR"
+
+
+def _create_raw(con: duckdb.DuckDBPyConnection, sources: List[str], json_format: str) -> None:
+    # `raw` keeps each record twice: RAW_JSON_COLUMN is its original JSON text and
+    # RAW_COLUMN a single STRUCT parsed from it, which the flat SELECT reads fields from.
+    # The struct type is inferred first over every record (sample_size=-1, so all sampled
+    # paths exist); records=false keeps the whole record in one column so top-level keys
+    # never clash with it. MAP inference is disabled because struct-field access does not
+    # work on MAP columns.
+    try:
+        res = con.execute(f"""
+        SELECT json
+        FROM read_json_auto(?,
+                            format='{json_format}',
+                            records=false,
+                            union_by_name=true,
+                            maximum_object_size={MAX_OBJECT_SIZE},
+                            sample_size=-1,
+                            map_inference_threshold=-1)
+        LIMIT 0
+        """, [sources])
+    except duckdb.Error as e:
+        # e.g. keys differing only by case ({"ID":1} and {"id":2}): STRUCT field names are
+        # case-insensitive. Keep the text only; adapt_select_to_raw then extracts from it.
+        print(f"WARN: cannot infer one record type, extracting columns from raw_json: {str(e).splitlines()[0]}", file=sys.stderr)
+        con.execute(f"""
+        CREATE OR REPLACE TABLE raw AS
+        SELECT json AS {RAW_JSON_COLUMN}
+        FROM read_json_objects(?, format='{json_format}', maximum_object_size={MAX_OBJECT_SIZE});
+        """, [sources])
+        return
+    structure = json.dumps(_json_structure(res.description[0][1]))
     con.execute(f"""
     CREATE OR REPLACE TABLE raw AS
-    SELECT line AS raw_json
-    FROM read_csv('{ndjson_path.as_posix()}',
-                  delim='\\n',
-                  header=false,
-                  columns={{'line':'VARCHAR'}},
-                  quote='',
-                  escape='');
-    """)
+    SELECT json AS {RAW_JSON_COLUMN}, json_transform(json, ?) AS {RAW_COLUMN}
+    FROM read_json_objects(?, format='{json_format}', maximum_object_size={MAX_OBJECT_SIZE});
+    """, [structure, sources])
+
+
+def create_raw_from_ndjson(con: duckdb.DuckDBPyConnection, ndjson_path: Path) -> None:
+    _create_raw(con, [ndjson_path.as_posix()], "newline_delimited")
+
+
+def create_raw_from_json_files(con: duckdb.DuckDBPyConnection, files: List[Path]) -> None:
+    # Same layout as create_raw_from_ndjson, but DuckDB parses the original inputs
+    # (JSON array / NDJSON / single object, detected per file) with its parallel reader.
+    _create_raw(con, [f.as_posix() for f in files], "auto")
+
+
+def _is_own_parquet_file(con: duckdb.DuckDBPyConnection, path: Path) -> bool:
+    """True if `path` is a Parquet file with a RAW_JSON_COLUMN, i.e. one this tool wrote."""
+    with path.open("rb") as fp:
+        if fp.read(4) != b"PAR1":
+            return False
+    try:
+        rows = con.execute("SELECT name FROM parquet_schema(?)", [path.as_posix()]).fetchall()
+    except duckdb.Error:
+        return False
+    return any(name == RAW_JSON_COLUMN for (name,) in rows)
+
+
+def clear_parquet_output(con: duckdb.DuckDBPyConnection, out_dir: Path) -> None:
+    """Remove a previous dataset at `out_dir` before it is rewritten as a directory.
+
+    In a directory only .parquet files are removed; one holding anything else is refused
+    (SystemExit), so a mistyped --out never deletes unrelated files (COPY's OVERWRITE would
+    empty the whole directory). A regular file there (older versions wrote the default
+    dataset as a single file) is removed only if it is a Parquet file this tool wrote.
+    """
+    if out_dir.is_file():
+        if not _is_own_parquet_file(con, out_dir):
+            raise SystemExit(
+                f"Refusing to replace {out_dir} with a Parquet dataset directory: it is a file "
+                "that this tool did not write. Choose another --out."
+            )
+        out_dir.unlink()
+        return
+    if not out_dir.is_dir():
+        return
+    entries = list(out_dir.iterdir())
+    others = [e for e in entries if e.suffix != ".parquet" or not e.is_file()]
+    if others:
+        raise SystemExit(
+            f"Refusing to write Parquet dataset into {out_dir}: it contains non-Parquet entries "
+            f"(e.g. {others[0].name}). Choose an empty or new --out directory."
+        )
+    for e in entries:
+        e.unlink()
 
 
 def create_flat_and_parquet(
@@ -289,11 +877,19 @@ def create_flat_and_parquet(
     flat_select_sql: str,
     out_parquet: Path,
     compression: str,
+    compression_level: int = DEFAULT_ZSTD_LEVEL,
 ) -> None:
-    con.execute(f"CREATE OR REPLACE TABLE flat AS {flat_select_sql};")
-    con.execute(
-        f"COPY flat TO '{out_parquet.as_posix()}' (FORMAT PARQUET, COMPRESSION '{compression}');"
-    )
+    # Stream the SELECT straight into the writer: no intermediate `flat` table.
+    # A path ending in .parquet is written as one file; anything else becomes a dataset
+    # directory with one file per writer thread.
+    options = f"FORMAT PARQUET, COMPRESSION '{compression}', ROW_GROUP_SIZE {PARQUET_ROW_GROUP_SIZE}"
+    # DuckDB only accepts COMPRESSION_LEVEL for ZSTD.
+    if compression.upper() == "ZSTD":
+        options += f", COMPRESSION_LEVEL {int(compression_level)}"
+    if out_parquet.suffix != ".parquet":
+        clear_parquet_output(con, out_parquet)
+        options += ", PER_THREAD_OUTPUT TRUE"
+    con.execute(f"COPY ({flat_select_sql}) TO ? ({options});", [out_parquet.as_posix()])
 
 
 def ensure_view_over_parquet(con: duckdb.DuckDBPyConnection, parquet_path: Path) -> None:
@@ -302,17 +898,26 @@ def ensure_view_over_parquet(con: duckdb.DuckDBPyConnection, parquet_path: Path)
         # Guard: directory exists but empty -> fail fast (avoids the scary "only one file read" misconception)
         if not list(parquet_path.glob("*.parquet")):
             raise SystemExit(f"Parquet directory has no .parquet files: {parquet_path}")
-        con.execute(f"CREATE OR REPLACE VIEW v AS SELECT * FROM read_parquet('{glob}');")
+        con.execute(f"CREATE OR REPLACE VIEW v AS SELECT * FROM read_parquet({sql_literal(glob)});")
     else:
         if not parquet_path.exists():
             raise SystemExit(f"Parquet file not found: {parquet_path}")
-        con.execute(f"CREATE OR REPLACE VIEW v AS SELECT * FROM read_parquet('{parquet_path.as_posix()}');")
+        con.execute(f"CREATE OR REPLACE VIEW v AS SELECT * FROM read_parquet({sql_literal(parquet_path.as_posix())});")
 
 
 # ---------------------------
 # Commands
 # ---------------------------
 
+def _ndjson_line(rec: object) -> bytes:
+    # default=float: ijson yields non-integer numbers as Decimal
+    try:
+        return orjson.dumps(rec, default=float)
+    except orjson.JSONEncodeError:
+        # e.g. integers beyond 64 bits, which json writes exactly
+        return json.dumps(rec, ensure_ascii=False, separators=(",", ":"), default=float).encode("utf-8")
+
+
 def cmd_normalize(args: argparse.Namespace) -> None:
     work = Path(args.work)
     work.mkdir(parents=True, exist_ok=True)
@@ -324,14 +929,18 @@ def cmd_normalize(args: argparse.Namespace) -> None:
 
     n = 0
     skipped = 0
-    with out_ndjson.open("w", encoding="utf-8") as out:
+    # orjson emits compact UTF-8 bytes (no ASCII escaping), so write them straight through.
+    with out_ndjson.open("wb", buffering=WRITE_BUFFER_SIZE) as out:
         for f in files:
             for rec in iter_records_from_file(f):
                 try:
-                    out.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
-                    n += 1
-                except Exception:
+                    line = _ndjson_line(rec)
+                except (TypeError, ValueError):
                     skipped += 1
+                    continue
+                out.write(line)
+                out.write(b"\n")
+                n += 1
 
     print(f"OK normalize: {n} records -> {out_ndjson} (skipped={skipped})")
 
@@ -342,7 +951,7 @@ def cmd_gen_schema(args: argparse.Namespace) -> None:
     if not ndjson_path.exists():
         raise SystemExit(f"NDJSON not found: {ndjson_path} (run normalize/build first)")
 
-    sql = generate_flat_select_sql(ndjson_path, args.sample)
+    sql = generate_schema_for_ndjson(args, ndjson_path)
     out_sql = work / args.schema_name
     out_sql.write_text(sql + ";\n", encoding="utf-8")
     print(f"OK schema: {out_sql}")
@@ -355,23 +964,24 @@ def cmd_to_parquet(args: argparse.Namespace) -> None:
     if not ndjson_path.exists():
         raise SystemExit(f"NDJSON not found: {ndjson_path} (run normalize/build first)")
 
-    if args.regen_schema or not schema_path.exists():
-        sql = generate_flat_select_sql(ndjson_path, args.sample)
-        schema_path.write_text(sql + ";\n", encoding="utf-8")
+    regen = args.regen_schema or not schema_path.exists()
+    if regen:
+        sql = generate_schema_for_ndjson(args, ndjson_path)
     else:
         sql = schema_path.read_text(encoding="utf-8").strip().rstrip(";")
 
     db_path = work / args.db_name
-    con = duckdb_connect(db_path, args.memory_limit)
+    con = duckdb_connect(db_path, args.memory_limit, args.threads, args.temp_dir)
     try:
-        if args.temp_dir:
-            con.execute(f"PRAGMA temp_directory='{Path(args.temp_dir).as_posix()}'")
-
         create_raw_from_ndjson(con, ndjson_path)
+        # sampled types may be narrower than what the full NDJSON holds
+        sql = adapt_select_to_raw(con, sql)
+        if regen:
+            schema_path.write_text(sql + ";\n", encoding="utf-8")
 
         out_parquet = Path(args.out) if args.out else (work / args.parquet_name)
         out_parquet.parent.mkdir(parents=True, exist_ok=True)
-        create_flat_and_parquet(con, sql, out_parquet, args.compression)
+        create_flat_and_parquet(con, sql, out_parquet, args.compression, args.compression_level)
 
         print(f"OK parquet: {out_parquet}")
     finally:
@@ -384,57 +994,154 @@ def cmd_export_csv(args: argparse.Namespace) -> None:
     parquet = Path(args.parquet) if args.parquet else (work / args.parquet_name)
     out_csv = Path(args.out)
 
-    con = duckdb_connect(db_path, args.memory_limit)
+    con = duckdb_connect(db_path, args.memory_limit, args.threads, args.temp_dir)
     try:
-        if args.temp_dir:
-            con.execute(f"PRAGMA temp_directory='{Path(args.temp_dir).as_posix()}'")
         ensure_view_over_parquet(con, parquet)
 
         con.execute(f"""
         COPY (
           {args.sql}
-        ) TO '{out_csv.as_posix()}' (HEADER, DELIMITER ',');
-        """)
+        ) TO ? (HEADER, DELIMITER ',');
+        """, [out_csv.as_posix()])
         print(f"OK csv: {out_csv}")
     finally:
         con.close()
 
 
+def iter_result_batches(res: duckdb.DuckDBPyConnection, limit: int = 0) -> Iterator[List[tuple]]:
+    """Yield result rows in batches of QUERY_BATCH_ROWS, stopping after `limit` rows (0 = all)."""
+    remaining = limit
+    while True:
+        size = min(QUERY_BATCH_ROWS, remaining) if limit else QUERY_BATCH_ROWS
+        rows = res.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+        if limit:
+            remaining -= len(rows)
+            if remaining <= 0:
+                return
+
+
+def _jsonl_row(obj: dict) -> bytes:
+    # Dates/times go through default=str like the json.dumps output (space, not 'T').
+    try:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_APPEND_NEWLINE)
+    except orjson.JSONEncodeError:
+        # e.g. HUGEINT values beyond 64 bits
+        return (json.dumps(obj, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
 def cmd_query(args: argparse.Namespace) -> None:
     work = Path(args.work)
     db_path = work / args.db_name
     parquet = Path(args.parquet) if args.parquet else (work / args.parquet_name)
 
-    con = duckdb_connect(db_path, args.memory_limit)
+    con = duckdb_connect(db_path, args.memory_limit, args.threads, args.temp_dir)
     try:
-        if args.temp_dir:
-            con.execute(f"PRAGMA temp_directory='{Path(args.temp_dir).as_posix()}'")
         ensure_view_over_parquet(con, parquet)
 
         res = con.execute(args.sql)
         cols = [d[0] for d in res.description]
-        rows = res.fetchmany(args.limit) if args.limit else res.fetchall()
+        out = sys.stdout.buffer
 
         if args.format == "table":
-            print("\t".join(cols))
-            for r in rows:
-                print("\t".join("" if v is None else str(v) for v in r))
-        else:
-            for r in rows:
-                obj = {cols[i]: r[i] for i in range(len(cols))}
-                print(json.dumps(obj, ensure_ascii=False, default=str))
+            out.write(("\t".join(cols) + "\n").encode("utf-8"))
+        for rows in iter_result_batches(res, args.limit):
+            if args.format == "table":
+                text = "".join("\t".join("" if v is None else str(v) for v in r) + "\n" for r in rows)
+                out.write(text.encode("utf-8"))
+            else:
+                out.write(b"".join(_jsonl_row(dict(zip(cols, r))) for r in rows))
+        out.flush()
     finally:
         con.close()
 
 
+def build_direct(args: argparse.Namespace) -> bool:
+    """build without NDJSON normalization: DuckDB reads the inputs directly.
+
+    Returns False (after a warning) when DuckDB cannot read the inputs as JSON,
+    so the caller can fall back to normalization.
+    """
+    work = Path(args.work)
+    work.mkdir(parents=True, exist_ok=True)
+
+    files = iter_input_files(args.inputs, args.glob)
+    if not files:
+        raise SystemExit("No input files found.")
+
+    db_path = work / args.db_name
+    con = duckdb_connect(db_path, args.memory_limit, args.threads, args.temp_dir)
+    try:
+        try:
+            create_raw_from_json_files(con, files)
+        except duckdb.Error as e:
+            print(f"WARN: direct ingest failed, falling back to normalize: {e}", file=sys.stderr)
+            return False
+        n = con.execute("SELECT COUNT(*) FROM raw").fetchone()[0]
+        print(f"OK ingest: {n} records from {len(files)} files")
+
+        build_from_raw(
+            args,
+            con,
+            lambda: generate_flat_select_sql_from_files(
+                con, files, args.sample, args.stable_after, not args.all_varchar
+            ),
+        )
+    finally:
+        con.close()
+    return True
+
+
+def build_from_raw(args: argparse.Namespace, con: duckdb.DuckDBPyConnection, python_schema: Callable[[], str]) -> None:
+    """Write the schema and the Parquet dataset from the `raw` table loaded on `con`.
+
+    The schema is always regenerated. duckdb discovery reads it off `raw`'s inferred type;
+    python discovery, and duckdb discovery when `raw` has no struct (see _create_raw), calls
+    `python_schema` (which only parses the --sample records).
+    """
+    work = Path(args.work)
+    schema_path = work / args.schema_name
+
+    if args.schema_discovery == "duckdb" and raw_struct_type(con) is not None:
+        sql = generate_flat_select_sql_from_raw(con, not args.all_varchar)
+    else:
+        sql = python_schema()
+    sql = adapt_select_to_raw(con, sql)
+    schema_path.write_text(sql + ";\n", encoding="utf-8")
+    print(f"OK schema: {schema_path}")
+
+    out_parquet = Path(args.out) if args.out else (work / args.parquet_name)
+    out_parquet.parent.mkdir(parents=True, exist_ok=True)
+    create_flat_and_parquet(con, sql, out_parquet, args.compression, args.compression_level)
+
+    print(f"OK parquet: {out_parquet}")
+
+
 def cmd_build(args: argparse.Namespace) -> None:
-    # normalize -> gen-schema -> to-parquet
+    if args.direct_ingest and build_direct(args):
+        return
+
+    # normalize, then load the NDJSON into DuckDB once: schema discovery and the
+    # Parquet write both run over that same `raw` table.
     cmd_normalize(args)
-    cmd_gen_schema(args)
 
-    # Reuse args for to-parquet; ensure regen_schema False (already generated)
-    args.regen_schema = False
-    cmd_to_parquet(args)
+    work = Path(args.work)
+    ndjson_path = work / args.ndjson_name
+    db_path = work / args.db_name
+    con = duckdb_connect(db_path, args.memory_limit, args.threads, args.temp_dir)
+    try:
+        create_raw_from_ndjson(con, ndjson_path)
+        build_from_raw(
+            args,
+            con,
+            lambda: generate_flat_select_sql(
+                ndjson_path, args.sample, args.stable_after, args.sample_workers, not args.all_varchar
+            ),
+        )
+    finally:
+        con.close()
 
 
 # ---------------------------
@@ -458,6 +1165,34 @@ def build_parser() -> argparse.ArgumentParser:
         )
         sp.add_argument("--glob", default="*.json", help="Glob pattern when --in points to a directory.")
 
+    def add_sample_opts(sp: argparse.ArgumentParser) -> None:
+        sp.add_argument(
+            "--all-varchar",
+            action="store_true",
+            help="Extract every scalar as a string instead of BIGINT/DOUBLE/BOOLEAN columns.",
+        )
+        sp.add_argument(
+            "--schema-discovery",
+            choices=["duckdb", "python"],
+            default="duckdb",
+            help="duckdb: use the types read_json_auto infers (from --sample records; build uses "
+            "every loaded record); python: walk --sample parsed records in Python (default: duckdb).",
+        )
+        sp.add_argument(
+            "--stable-after",
+            type=int,
+            default=None,
+            help="python discovery: stop sampling after this many records add no new path "
+            "(default: max(500, sample/20); 0 = scan all --sample records).",
+        )
+        sp.add_argument(
+            "--sample-workers",
+            type=int,
+            default=1,
+            help="python discovery: processes for sampling large NDJSON, used only when --sample gives "
+            f"each at least {PARALLEL_SAMPLE_MIN_RECORDS} records (default: 1 = serial).",
+        )
+
     def add_work_opts(sp: argparse.ArgumentParser) -> None:
         sp.add_argument("--work", default="staging", help="Working directory for artifacts.")
         sp.add_argument("--ndjson-name", default="all.ndjson", help="NDJSON filename within --work.")
@@ -466,6 +1201,12 @@ def build_parser() -> argparse.ArgumentParser:
         sp.add_argument("--db-name", default="work.duckdb", help="DuckDB file within --work.")
         sp.add_argument("--memory-limit", default="4GB", help="DuckDB memory limit (e.g., 2GB, 8GB).")
         sp.add_argument("--temp-dir", default=None, help="DuckDB temp dir for spill files (optional).")
+        sp.add_argument(
+            "--threads",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="DuckDB worker threads (default: CPU count).",
+        )
 
     sp = sub.add_parser("normalize", help="Normalize mixed JSON inputs into work/all.ndjson")
     add_in_opts(sp)
@@ -475,23 +1216,47 @@ def build_parser() -> argparse.ArgumentParser:
     sp = sub.add_parser("gen-schema", help="Generate work/flat_select.sql (flatten extraction SELECT)")
     add_work_opts(sp)
     sp.add_argument("--sample", type=int, default=20000, help="How many NDJSON records to scan for schema.")
+    add_sample_opts(sp)
     sp.set_defaults(func=cmd_gen_schema)
 
     sp = sub.add_parser("to-parquet", help="Build Parquet dataset from NDJSON + schema")
     add_work_opts(sp)
     sp.add_argument("--out", default=None, help="Parquet output path (dir or file). Default: work/flat_parquet")
     sp.add_argument("--sample", type=int, default=20000, help="Scan count if (re)generating schema.")
+    add_sample_opts(sp)
     sp.add_argument("--regen-schema", action="store_true", help="Regenerate schema even if schema file exists.")
     sp.add_argument("--compression", default="ZSTD", help="Parquet compression (e.g., ZSTD, SNAPPY, GZIP).")
+    sp.add_argument(
+        "--compression-level",
+        type=int,
+        default=DEFAULT_ZSTD_LEVEL,
+        help=f"ZSTD compression level (ignored for other codecs; default: {DEFAULT_ZSTD_LEVEL}).",
+    )
     sp.set_defaults(func=cmd_to_parquet)
 
     sp = sub.add_parser("build", help="normalize + gen-schema + to-parquet")
     add_in_opts(sp)
     add_work_opts(sp)
     sp.add_argument("--out", default=None, help="Parquet output path (dir or file). Default: work/flat_parquet")
-    sp.add_argument("--sample", type=int, default=20000, help="How many NDJSON records to scan for schema.")
-    sp.add_argument("--regen-schema", action="store_true", help="Regenerate schema even if schema file exists.")
+    sp.add_argument(
+        "--sample",
+        type=int,
+        default=20000,
+        help="How many records to scan for schema (python discovery; duckdb discovery uses every loaded record).",
+    )
+    add_sample_opts(sp)
     sp.add_argument("--compression", default="ZSTD", help="Parquet compression (e.g., ZSTD, SNAPPY, GZIP).")
+    sp.add_argument(
+        "--compression-level",
+        type=int,
+        default=DEFAULT_ZSTD_LEVEL,
+        help=f"ZSTD compression level (ignored for other codecs; default: {DEFAULT_ZSTD_LEVEL}).",
+    )
+    sp.add_argument(
+        "--direct-ingest",
+        action="store_true",
+        help="Let DuckDB read the inputs directly (no NDJSON file); falls back to normalize if it cannot.",
+    )
     sp.set_defaults(func=cmd_build)
 
     sp = sub.add_parser("query", help="Run SQL against Parquet view v")
@@ -0,0 +1,378 @@
+import json
+from pathlib import Path
+
+import duckdb
+import pytest
+
+from json_query import cli
+
+
+def build(tmp_path: Path, records, *extra: str) -> Path:
+    src = tmp_path / "in.json"
+    src.write_text(json.dumps(records), encoding="utf-8")
+    work = tmp_path / "work"
+    cli.main(["build", "--in", str(src), "--work", str(work), "--threads", "1", *extra])
+    return work
+
+
+def read_rows(work: Path, sql: str = "SELECT * FROM v") -> list:
+    con = duckdb.connect()
+    try:
+        cli.ensure_view_over_parquet(con, work / "flat_parquet")
+        res = con.execute(sql)
+        cols = [d[0] for d in res.description]
+        return [dict(zip(cols, r)) for r in res.fetchall()]
+    finally:
+        con.close()
+
+
+@pytest.mark.parametrize(
+    "extra",
+    [(), ("--schema-discovery", "python"), ("--direct-ingest",)],
+)
+def test_build_keeps_string_scalars_verbatim(tmp_path, extra):
+    records = [
+        {"tz": "2024-01-02T03:04:05+09:00", "t": "10:00", "d": "2024-01-02"},
+        {"tz": "2024-06-30T23:59:59-05:30", "t": "23:15", "d": "2024-02-29"},
+    ]
+    work = build(tmp_path, records, *extra)
+
+    rows = read_rows(work, "SELECT tz, t, d FROM v ORDER BY d")
+    assert rows == records
+
+
+def test_build_raw_json_is_the_original_record(tmp_path):
+    records = [{"attrs": {f"k{i}": i}, "n": i} for i in range(3)] + [{"n": 1.5}]
+    work = build(tmp_path, records)
+
+    rows = read_rows(work, "SELECT raw_json FROM v")
+    assert sorted(r["raw_json"] for r in rows) == sorted(
+        json.dumps(r, separators=(",", ":")) for r in records
+    )
+
+
+def test_normalize_keeps_integers_beyond_64_bits(tmp_path):
+    src = tmp_path / "in.json"
+    src.write_text('{"id":123456789012345678901234567890,"name":"日本"}', encoding="utf-8")
+    work = tmp_path / "work"
+    cli.main(["normalize", "--in", str(src), "--work", str(work)])
+
+    text = (work / "all.ndjson").read_text(encoding="utf-8")
+    assert text == '{"id":123456789012345678901234567890,"name":"日本"}\n'
+
+
+def test_parse_ndjson_line_falls_back_to_json():
+    assert cli.parse_ndjson_line(b'{"a":1,"b":"x"}\n') == {"a": 1, "b": "x"}
+    assert cli.parse_ndjson_line(b'{"id":12345678901234567890123}\n') == {"id": 12345678901234567890123}
+    rec = cli.parse_ndjson_line(b'{"x":NaN,"y":Infinity}\n')
+    assert rec["x"] != rec["x"] and rec["y"] == float("inf")
+    with pytest.raises(ValueError):
+        cli.parse_ndjson_line(b'{"a":\n')
+
+
+def test_normalize_ndjson_keeps_big_integers_and_nan(tmp_path):
+    src = tmp_path / "in.ndjson"
+    src.write_text('not json\n{"id":12345678901234567890123}\n{"x":NaN}\n', encoding="utf-8")
+    work = tmp_path / "work"
+    cli.main(["normalize", "--in", str(src), "--work", str(work)])
+
+    lines = (work / "all.ndjson").read_text(encoding="utf-8").splitlines()
+    assert lines == ['{"id":12345678901234567890123}', '{"x":null}']
+
+
+def test_parallel_sampling_matches_serial(tmp_path, monkeypatch):
+    ndjson = tmp_path / "all.ndjson"
+    ndjson.write_text("".join(json.dumps({"a": i, f"k{i % 7}": "x"}) + "\n" for i in range(200)), encoding="utf-8")
+    serial = cli.generate_flat_select_sql(ndjson, 200, stable_after=0)
+
+    monkeypatch.setattr(cli, "PARALLEL_SAMPLE_MIN_BYTES", 0)
+    monkeypatch.setattr(cli, "PARALLEL_SAMPLE_MIN_RECORDS", 50)
+    assert cli.generate_flat_select_sql(ndjson, 200, stable_after=0, workers=2) == serial
+
+
+def test_normalize_array_with_uint64_ids(tmp_path):
+    src = tmp_path / "in.json"
+    src.write_text('[{"id":18446744073709551615,"v":1.25},{"id":123456789012345678901234567890,"v":2}]', encoding="utf-8")
+    work = tmp_path / "work"
+    cli.main(["normalize", "--in", str(src), "--work", str(work)])
+
+    lines = (work / "all.ndjson").read_text(encoding="utf-8").splitlines()
+    assert lines == ['{"id":18446744073709551615,"v":1.25}', '{"id":123456789012345678901234567890,"v":2}']
+
+
+class ShortReader:
+    """File-like object returning at most `n` characters per read."""
+
+    def __init__(self, text: str, n: int) -> None:
+        self.text = text
+        self.pos = 0
+        self.n = n
+
+    def read(self, size: int = -1) -> str:
+        chunk = self.text[self.pos : self.pos + self.n]
+        self.pos += len(chunk)
+        return chunk
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 5, 7])
+def test_iter_json_array_stream_numbers_split_across_reads(n):
+    text = '[3.5, 1e+5, -12.25E-3, 1234567, {"a": 6.02e23, "b": [0.5, 2]}, "x", true, null]'
+    assert list(cli.iter_json_array_stream(ShortReader(text, n))) == json.loads(text)
+
+
+def test_build_rewrites_dataset_but_keeps_unrelated_files(tmp_path):
+    work = build(tmp_path, [{"a": 1}])
+    work = build(tmp_path, [{"a": 2}])
+    assert read_rows(work, "SELECT a FROM v") == [{"a": 2}]
+
+    out = tmp_path / "outdir"
+    out.mkdir()
+    (out / "important.txt").write_text("keep", encoding="utf-8")
+    with pytest.raises(SystemExit):
+        build(tmp_path, [{"a": 3}], "--out", str(out))
+    assert (out / "important.txt").read_text(encoding="utf-8") == "keep"
+
+
+@pytest.mark.parametrize("discovery", ["python", "duckdb"])
+def test_to_parquet_widens_sampled_types(tmp_path, discovery):
+    records = [{"n": i, "f": True} for i in range(5)] + [{"n": 1.7, "f": "yes"}, {"n": 2.5, "f": False}]
+    work = tmp_path / "work"
+    work.mkdir()
+    (work / "all.ndjson").write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+    opts = ["--work", str(work), "--threads", "1", "--sample", "5", "--schema-discovery", discovery]
+    cli.main(["gen-schema", *opts])
+    assert "TRY_CAST(rec.\"n\" AS BIGINT)" in (work / "flat_select.sql").read_text(encoding="utf-8")
+    cli.main(["to-parquet", *opts])
+
+    rows = read_rows(work, "SELECT n, f FROM v")
+    assert sorted(r["n"] for r in rows) == [0, 1, 1.7, 2, 2.5, 3, 4]
+    assert sorted(r["f"] for r in rows) == ["false", "true", "true", "true", "true", "true", "yes"]
+
+
+def test_build_python_discovery_widens_sampled_types(tmp_path):
+    records = [{"n": i} for i in range(5)] + [{"n": 2.5}]
+    work = build(tmp_path, records, "--schema-discovery", "python", "--sample", "5")
+
+    assert sorted(r["n"] for r in read_rows(work, "SELECT n FROM v")) == [0, 1, 2, 2.5, 3, 4]
+
+
+def test_build_has_no_regen_schema_option():
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(["build", "--in", "x", "--regen-schema"])
+
+
+CASE_COLLIDING = [
+    {"ID": 1, "u": {"n": 0}},
+    {"id": 2, "u": {"Name": "a", "name": "b"}},
+]
+
+
+@pytest.mark.parametrize(
+    "extra",
+    [(), ("--schema-discovery", "python"), ("--direct-ingest",)],
+)
+def test_build_keys_differing_only_by_case(tmp_path, extra):
+    work = build(tmp_path, CASE_COLLIDING, *extra)
+
+    rows = read_rows(work, "SELECT COLUMNS(* EXCLUDE (raw_json)) FROM v ORDER BY raw_json")
+    assert [list(r.values()) for r in rows] == [
+        ["1", "0", None, None, None, '{"n":0}'],
+        [None, None, "2", "a", "b", '{"Name":"a","name":"b"}'],
+    ]
+
+
+def test_gen_schema_then_to_parquet_keys_differing_only_by_case(tmp_path):
+    work = tmp_path / "work"
+    work.mkdir()
+    (work / "all.ndjson").write_text("".join(json.dumps(r) + "\n" for r in CASE_COLLIDING), encoding="utf-8")
+    cli.main(["gen-schema", "--work", str(work)])
+    cli.main(["to-parquet", "--work", str(work), "--threads", "1"])
+
+    assert [r["u__json"] for r in read_rows(work, "SELECT u__json FROM v ORDER BY raw_json")] == [
+        '{"n":0}',
+        '{"Name":"a","name":"b"}',
+    ]
+
+
+@pytest.mark.parametrize(
+    "extra",
+    [(), ("--schema-discovery", "python"), ("--direct-ingest",)],
+)
+def test_build_json_columns_keep_original_values(tmp_path, extra):
+    records = [
+        {"o": {"v": 1}, "l": [1, 2], "m": [{"a": 1}, {"b": "x"}]},
+        {"o": {"v": 2.5}, "l": [1.5], "e": {}},
+        {"o": {}, "e": {"k": 1}},
+    ]
+    work = build(tmp_path, records, *extra)
+
+    rows = read_rows(work)
+    by_raw = {json.dumps(json.loads(r["raw_json"])): r for r in rows}
+    for rec in records:
+        row = by_raw[json.dumps(rec)]
+        for key in ("o", "l", "m", "e"):
+            expected = json.dumps(rec[key], separators=(",", ":")) if key in rec else None
+            assert row[f"{key}__json"] == expected
+
+
+def counted(records):
+    """Wrap `records` in a generator; returns (generator, list whose length is the count consumed)."""
+    consumed = []
+
+    def gen():
+        for rec in records:
+            consumed.append(rec)
+            yield rec
+
+    return gen(), consumed
+
+
+def test_sample_records_stops_once_paths_are_stable():
+    records = [{f"k{i}": i} for i in range(10)] + [{"k0": 1}] * 400 + [{"late": 1}]
+
+    gen, consumed = counted(records)
+    scalar_paths, _ = cli._sample_records(gen, 1000, 50)
+    assert len(consumed) == 10 + 50
+    assert list(scalar_paths) == [f"$.k{i}" for i in range(10)]
+
+    gen, consumed = counted(records)
+    scalar_paths, _ = cli._sample_records(gen, 300, 0)
+    assert len(consumed) == 300
+
+    gen, consumed = counted(records)
+    scalar_paths, _ = cli._sample_records(gen, 1000, 0)
+    assert len(consumed) == len(records)
+    assert "$.late" in scalar_paths
+
+
+def test_build_replaces_single_file_dataset_from_older_versions(tmp_path):
+    work = tmp_path / "work"
+    work.mkdir()
+    con = duckdb.connect()
+    con.execute("COPY (SELECT '{\"a\":0}' AS raw_json, '0' AS a) TO ? (FORMAT PARQUET)", [str(work / "flat_parquet")])
+    con.close()
+
+    build(tmp_path, [{"a": 1}])
+    assert (work / "flat_parquet").is_dir()
+    assert read_rows(work, "SELECT a FROM v") == [{"a": 1}]
+
+
+def test_build_refuses_to_replace_foreign_file(tmp_path):
+    work = tmp_path / "work"
+    work.mkdir()
+    (work / "flat_parquet").write_text("not parquet", encoding="utf-8")
+
+    with pytest.raises(SystemExit):
+        build(tmp_path, [{"a": 1}])
+    assert (work / "flat_parquet").read_text(encoding="utf-8") == "not parquet"
+
+
+def test_paths_with_quotes_round_trip(tmp_path, capsys):
+    base = tmp_path / "it's here"
+    base.mkdir()
+    work = build(base, [{"a": 1, "s": "x"}, {"a": 2, "s": "y"}])
+    capsys.readouterr()
+
+    cli.main(["query", "--work", str(work), "SELECT a, s FROM v ORDER BY a"])
+    assert capsys.readouterr().out == "a\ts\n1\tx\n2\ty\n"
+
+    out_csv = base / "o'ut.csv"
+    cli.main(["export-csv", "--work", str(work), "--out", str(out_csv), "SELECT a, s FROM v ORDER BY a"])
+    assert out_csv.read_text(encoding="utf-8").splitlines() == ["a,s", "1,x", "2,y"]
+
+
+@pytest.fixture
+def query_work(tmp_path, capsys):
+    records = [{"n": i, "s": None if i % 3 == 0 else f"v{i}"} for i in range(10)]
+    work = build(tmp_path, records)
+    capsys.readouterr()
+    return work
+
+
+def run_query(capsys, work: Path, sql: str, *extra: str) -> str:
+    cli.main(["query", "--work", str(work), *extra, sql])
+    return capsys.readouterr().out
+
+
+@pytest.mark.parametrize("limit, expected", [(0, 10), (2, 2), (7, 7), (50, 10)])
+def test_query_table_limit_across_batches(query_work, capsys, monkeypatch, limit, expected):
+    monkeypatch.setattr(cli, "QUERY_BATCH_ROWS", 3)
+    out = run_query(capsys, query_work, "SELECT n, s FROM v ORDER BY n", "--limit", str(limit))
+
+    lines = out.splitlines()
+    assert lines[0] == "n\ts"
+    assert lines[1:] == [f"{i}\t{'' if i % 3 == 0 else f'v{i}'}" for i in range(expected)]
+
+
+@pytest.mark.parametrize("limit, expected", [(0, 10), (4, 4), (50, 10)])
+def test_query_jsonl_limit_across_batches(query_work, capsys, monkeypatch, limit, expected):
+    monkeypatch.setattr(cli, "QUERY_BATCH_ROWS", 3)
+    out = run_query(capsys, query_work, "SELECT n, s FROM v ORDER BY n", "--format", "jsonl", "--limit", str(limit))
+
+    assert [json.loads(line) for line in out.splitlines()] == [
+        {"n": i, "s": None if i % 3 == 0 else f"v{i}"} for i in range(expected)
+    ]
+
+
+def test_query_jsonl_hugeint_falls_back_to_json(query_work, capsys):
+    big = 2**100
+    out = run_query(
+        capsys,
+        query_work,
+        f"SELECT {big}::HUGEINT AS h, NULL AS z, DATE '2024-01-02' AS d UNION ALL SELECT 1, NULL, NULL",
+        "--format",
+        "jsonl",
+    )
+
+    assert sorted((json.loads(line) for line in out.splitlines()), key=lambda r: r["h"]) == [
+        {"h": 1, "z": None, "d": None},
+        {"h": big, "z": None, "d": "2024-01-02"},
+    ]
+
+
+def test_walk_paths_types_integers_beyond_int64_as_varchar():
+    scalar_paths = {}
+    for rec in ({"a": 2**63 - 1, "b": -(2**63), "c": 2**63}, {"d": 1}, {"d": -(2**63) - 1}):
+        cli.walk_paths(rec, scalar_paths, ([], set()))
+    assert scalar_paths == {"$.a": "BIGINT", "$.b": "BIGINT", "$.c": "VARCHAR", "$.d": "VARCHAR"}
+
+
+@pytest.mark.parametrize(
+    "extra",
+    [(), ("--schema-discovery", "python"), ("--direct-ingest",), ("--schema-discovery", "python", "--sample", "1")],
+)
+def test_build_keeps_integers_beyond_int64_exact(tmp_path, extra):
+    records = [
+        {"id": 5, "x": 1.5, "n": 1},
+        {"id": 123456789012345678901234567890, "x": 98765432109876543210, "n": 2},
+    ]
+    work = build(tmp_path, records, *extra)
+
+    rows = read_rows(work, "SELECT id, x, n FROM v ORDER BY n")
+    assert [(str(r["id"]), str(r["x"]), r["n"]) for r in rows] == [
+        ("5", "1.5", 1),
+        ("123456789012345678901234567890", "98765432109876543210", 2),
+    ]
+
+
+def test_iter_input_files(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    d = Path("in")
+    (d / "dir.json").mkdir(parents=True)
+    (d / "sub").mkdir()
+    for name in ("b.json", "a.json", "c.txt", "sub/x.json", "sub/y.txt", "dir.json/z.json"):
+        (d / name).write_text("{}", encoding="utf-8")
+
+    assert cli.iter_input_files(["in"], "*.json") == [d / "a.json", d / "b.json"]
+    assert cli.iter_input_files(["in/a.json", "./in/a.json", "in", "in/missing.json"], "*.json") == [
+        d / "a.json",
+        d / "b.json",
+    ]
+    assert "not found: in/missing.json" in capsys.readouterr().err
+    assert cli.iter_input_files(["in"], "sub/*.json") == [d / "sub" / "x.json"]
+    assert cli.iter_input_files(["in"], "**/*.json") == [
+        d / "a.json",
+        d / "b.json",
+        d / "dir.json" / "z.json",
+        d / "sub" / "x.json",
+    ]